@@ -0,0 +1,211 @@
+"""
+批量写入（group commit）
+
+把在几毫秒窗口内并发到达的创建、更新、删除请求合并为一次数据库事务，
+只提交一次，从而摊薄每次提交的磁盘同步开销。每个调用方仍然得到
+各自的结果；某一条写入失败时不会影响同批次的其他写入。
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, WRITE_BATCH_WINDOW_MS, WRITE_BATCH_MAX_SIZE
+from models import Product
+from schemas import ProductCreate, ProductUpdate, ProductResponse
+from services import ProductService
+
+
+@dataclass
+class _WriteOp:
+    """批次中的一条写操作"""
+    kind: str  # "create" / "update" / "delete"
+    future: asyncio.Future
+    product_id: Optional[int] = None
+    data: Any = None
+
+
+@dataclass
+class _BatchState:
+    """一次批次执行过程中的状态"""
+    products: Dict[int, Product] = field(default_factory=dict)  # 预取的更新/删除目标
+    deleted_ids: Set[int] = field(default_factory=set)
+
+
+class WriteBatcher:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        window_ms: float = WRITE_BATCH_WINDOW_MS,
+        max_batch_size: int = WRITE_BATCH_MAX_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: List[_WriteOp] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def create(self, product_data: ProductCreate) -> ProductResponse:
+        """创建新产品"""
+        return await self._submit("create", data=product_data)
+
+    async def update(self, product_id: int, product_data: ProductUpdate) -> Optional[ProductResponse]:
+        """更新产品，产品不存在时返回None"""
+        return await self._submit("update", product_id=product_id, data=product_data)
+
+    async def delete(self, product_id: int) -> bool:
+        """删除产品，产品不存在时返回False"""
+        return await self._submit("delete", product_id=product_id)
+
+    async def _submit(self, kind: str, product_id: Optional[int] = None, data: Any = None):
+        """加入待提交队列并等待所在批次完成"""
+        loop = asyncio.get_running_loop()
+        op = _WriteOp(kind=kind, future=loop.create_future(), product_id=product_id, data=data)
+        self._pending.append(op)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._start_flush)
+
+        return await op.future
+
+    def _start_flush(self):
+        """取出当前队列，在线程池中执行该批次
+
+        同一时间只有一个批次在执行；上一个批次提交期间到达的请求继续排队，
+        在它完成后立即组成下一个批次，避免批次堆积占满连接池。
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._flush_task is not None or not self._pending:
+            return
+
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self._flush_task.add_done_callback(self._on_flush_done)
+
+    def _on_flush_done(self, task: asyncio.Task):
+        """批次完成后立即提交执行期间积累的请求"""
+        self._flush_task = None
+        if self._pending:
+            self._start_flush()
+
+    async def _flush(self, batch: List[_WriteOp]):
+        """执行批次并把结果分发给各个调用方"""
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(None, self._execute, batch)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for op, result in zip(batch, results):
+            if op.future.done():
+                continue
+            if isinstance(result, Exception):
+                op.future.set_exception(result)
+            else:
+                op.future.set_result(result)
+
+    def _execute(self, batch: List[_WriteOp]) -> list:
+        """在单个事务中执行整个批次，返回与批次一一对应的结果或异常"""
+        db = self.session_factory()
+        try:
+            try:
+                # 快速路径：所有写操作一次flush，只提交一次
+                state = self._prefetch(db, batch)
+                results = [self._apply(db, op, state) for op in batch]
+                db.flush()
+                results = self._load_results(db, results)
+                db.commit()
+            except Exception:
+                # 有操作失败：回滚后逐条在保存点中重放，隔离失败的操作
+                db.rollback()
+                results = self._replay_isolated(db, batch)
+                results = self._load_results(db, results)
+                db.commit()
+
+            # 响应在提交前已经生成，提交成功后不再访问数据库，已提交的写入不会被报告为失败
+            return results
+        finally:
+            db.close()
+
+    def _replay_isolated(self, db: Session, batch: List[_WriteOp]) -> list:
+        """每条写操作使用独立的保存点执行，失败只回滚自身"""
+        state = self._prefetch(db, batch)
+        results = []
+        for op in batch:
+            savepoint = db.begin_nested()
+            deleted_ids = set(state.deleted_ids)
+            try:
+                result = self._apply(db, op, state)
+                db.flush()
+                savepoint.commit()
+                results.append(result)
+            except Exception as e:
+                savepoint.rollback()
+                state.deleted_ids = deleted_ids
+                results.append(e)
+        return results
+
+    def _prefetch(self, db: Session, batch: List[_WriteOp]) -> _BatchState:
+        """用一次IN查询加载批次中所有更新/删除的目标产品"""
+        state = _BatchState()
+        product_ids = {op.product_id for op in batch if op.kind in ("update", "delete")}
+        if product_ids:
+            products = db.query(Product).filter(Product.product_id.in_(product_ids)).all()
+            state.products = {p.product_id: p for p in products}
+        return state
+
+    def _apply(self, db: Session, op: _WriteOp, state: _BatchState):
+        """将单条写操作应用到会话（不提交）"""
+        service = ProductService(db)
+
+        if op.kind == "create":
+            db_product = service.build_product(op.data)
+            db.add(db_product)
+            return db_product
+
+        if op.product_id in state.deleted_ids:
+            db_product = None
+        else:
+            db_product = state.products.get(op.product_id)
+
+        if op.kind == "update":
+            if not db_product:
+                return None
+            service.apply_update(db_product, op.data)
+            return db_product
+
+        if op.kind == "delete":
+            if not db_product:
+                return False
+            db.delete(db_product)
+            state.deleted_ids.add(op.product_id)
+            return True
+
+        raise ValueError(f"未知的写操作类型: {op.kind}")
+
+    def _load_results(self, db: Session, results: list) -> list:
+        """flush之后、提交之前用一次查询加载数据库生成的字段，并转换为响应模型"""
+        product_ids = [r.product_id for r in results if isinstance(r, Product)]
+        if product_ids:
+            # 一次IN查询加载created_at等服务端默认值，并用数据库中的值覆盖已更新的字段
+            # （如DECIMAL的精度），与逐条refresh的结果一致
+            (
+                db.query(Product)
+                .filter(Product.product_id.in_(product_ids))
+                .populate_existing()
+                .all()
+            )
+
+        return [
+            ProductResponse.model_validate(r) if isinstance(r, Product) else r
+            for r in results
+        ]
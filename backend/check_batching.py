@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+批量写入检查脚本 - 验证WriteBatcher的行为并对比批量/逐条提交的写入吞吐
+
+用法:
+    python check_batching.py                     # 在临时SQLite数据库上运行检查
+    python check_batching.py --benchmark         # 额外运行吞吐对比
+    python check_batching.py --benchmark --db-url "mysql+pymysql://root:1@host:3306/NUS_bench"
+
+注意: --db-url 指向的数据库中的products表会被清空，请使用专门的测试库。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Product
+from schemas import ProductCreate, ProductUpdate
+from services import ProductService
+from batching import WriteBatcher
+
+
+def make_session_factory(db_url: str):
+    """创建引擎并重建products表"""
+    # 连接池容纳全部并发写入者，避免逐条提交的对比受连接池等待影响；
+    # SQLite只允许一个写事务，其余写入者需要等待锁
+    connect_args = {"timeout": 60} if db_url.startswith("sqlite") else {}
+    engine = create_engine(db_url, pool_size=20, max_overflow=100, connect_args=connect_args)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def check_results(session_factory):
+    """每个调用方得到各自的结果"""
+    async def run():
+        batcher = WriteBatcher(session_factory=session_factory)
+        created = await asyncio.gather(*[
+            batcher.create(ProductCreate(name=f"产品{i}", sales_price=Decimal("10"), sales_tax_rate="9% SR"))
+            for i in range(20)
+        ])
+        assert len({p.product_id for p in created}) == 20
+        assert all(p.created_at is not None for p in created)
+        assert created[0].sales_price_incl_tax == Decimal("10.90")
+
+        ids = [p.product_id for p in created]
+        updated, missing_update, deleted, missing_delete = await asyncio.gather(
+            batcher.update(ids[0], ProductUpdate(sales_price=Decimal("20"))),
+            batcher.update(999999, ProductUpdate(name="不存在")),
+            batcher.delete(ids[1]),
+            batcher.delete(999999),
+        )
+        assert updated.sales_price == Decimal("20.00") and updated.sales_price_incl_tax == Decimal("21.80")
+        assert missing_update is None and deleted is True and missing_delete is False
+
+    asyncio.run(run())
+
+
+def check_duplicate_ids(session_factory):
+    """同一批次中多次写同一个产品时按到达顺序生效"""
+    db = session_factory()
+    try:
+        product_id = ProductService(db).create_product(ProductCreate(name="重复ID")).product_id
+    finally:
+        db.close()
+
+    async def run():
+        batcher = WriteBatcher(session_factory=session_factory, window_ms=50)
+        first, second, deleted, after_delete, deleted_again = await asyncio.gather(
+            batcher.update(product_id, ProductUpdate(name="第一次")),
+            batcher.update(product_id, ProductUpdate(description="第二次")),
+            batcher.delete(product_id),
+            batcher.update(product_id, ProductUpdate(name="删除后")),
+            batcher.delete(product_id),
+        )
+        assert first.name == "第一次" and second.description == "第二次"
+        assert deleted is True and after_delete is None and deleted_again is False
+
+    asyncio.run(run())
+    db = session_factory()
+    try:
+        assert db.get(Product, product_id) is None
+    finally:
+        db.close()
+
+
+def check_failure_isolation(session_factory):
+    """批次中一条写入失败时，其他写入照常提交"""
+    async def run():
+        batcher = WriteBatcher(session_factory=session_factory, window_ms=50)
+        # 绕过校验构造一条违反NOT NULL约束的写入
+        bad = ProductCreate.model_construct(
+            name=None, sales_price=None, sales_tax_rate=None, sales_price_incl_tax=None
+        )
+        return await asyncio.gather(
+            batcher.create(ProductCreate(name="正常1")),
+            batcher.create(bad),
+            batcher.create(ProductCreate(name="正常2")),
+            return_exceptions=True,
+        )
+
+    ok1, failed, ok2 = asyncio.run(run())
+    assert isinstance(failed, Exception)
+    assert not isinstance(ok1, Exception) and not isinstance(ok2, Exception)
+    db = session_factory()
+    try:
+        names = {p.name for p in db.query(Product).filter(Product.product_id.in_([ok1.product_id, ok2.product_id]))}
+        assert names == {"正常1", "正常2"}
+    finally:
+        db.close()
+
+
+def check_statement_count(engine, session_factory):
+    """一个批次只发出预取和结果加载两条SELECT"""
+    async def run(ids):
+        batcher = WriteBatcher(session_factory=session_factory, window_ms=50)
+        await asyncio.gather(
+            *[batcher.create(ProductCreate(name=f"计数{i}")) for i in range(5)],
+            *[batcher.update(i, ProductUpdate(name="计数更新")) for i in ids],
+        )
+
+    db = session_factory()
+    try:
+        ids = [p.product_id for p in db.query(Product).limit(5)]
+    finally:
+        db.close()
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split()[0].upper())
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        asyncio.run(run(ids))
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert statements.count("SELECT") == 2, statements
+
+
+def benchmark(session_factory, writers: int, writes_per_writer: int):
+    """对比逐条提交与批量提交在并发写入下的吞吐"""
+    total = writers * writes_per_writer
+
+    def write_one(i):
+        db = session_factory()
+        try:
+            ProductService(db).create_product(ProductCreate(name=f"逐条{i}"))
+        finally:
+            db.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        list(pool.map(write_one, range(total)))
+    single_rate = total / (time.perf_counter() - start)
+
+    async def run():
+        batcher = WriteBatcher(session_factory=session_factory)
+
+        async def writer(w):
+            for i in range(writes_per_writer):
+                await batcher.create(ProductCreate(name=f"批量{w}-{i}"))
+
+        await asyncio.gather(*[writer(w) for w in range(writers)])
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    batched_rate = total / (time.perf_counter() - start)
+
+    print(f"   并发写入者: {writers}，每个写入 {writes_per_writer} 条")
+    print(f"   逐条提交: {single_rate:,.0f} 条/秒")
+    print(f"   批量提交: {batched_rate:,.0f} 条/秒（{batched_rate / single_rate:.1f}倍）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量写入检查")
+    parser.add_argument("--db-url", help="测试数据库URL，默认使用临时SQLite文件")
+    parser.add_argument("--benchmark", action="store_true", help="运行吞吐对比")
+    parser.add_argument("--writers", type=int, default=100, help="并发写入者数量")
+    parser.add_argument("--writes", type=int, default=20, help="每个写入者的写入次数")
+    args = parser.parse_args()
+
+    db_url = args.db_url
+    if not db_url:
+        tmp_dir = tempfile.mkdtemp()
+        db_url = f"sqlite:///{os.path.join(tmp_dir, 'check_batching.db')}"
+
+    engine, session_factory = make_session_factory(db_url)
+    failed = False
+    for name, check in (
+        ("调用方各自的结果", lambda: check_results(session_factory)),
+        ("同批次重复ID", lambda: check_duplicate_ids(session_factory)),
+        ("失败隔离", lambda: check_failure_isolation(session_factory)),
+        ("批次SELECT数量", lambda: check_statement_count(engine, session_factory)),
+    ):
+        try:
+            check()
+            print(f"✅ {name}")
+        except Exception as e:
+            failed = True
+            print(f"❌ {name}: {e!r}")
+
+    if args.benchmark:
+        print("📊 吞吐对比")
+        benchmark(session_factory, args.writers, args.writes)
+
+    engine.dispose()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
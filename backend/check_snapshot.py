@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+目录快照检查脚本 - 验证快照编码/解码、查询规则和发布行为
+
+用法:
+    python check_snapshot.py                # 在临时SQLite数据库上运行检查
+    python check_snapshot.py --benchmark    # 额外对比快照与数据库的按ID读取速度
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Product
+from schemas import ProductSearchParams
+from services import ProductService
+import snapshot
+
+
+def make_rows():
+    """覆盖NULL、金额、时间、多字节字符和重复条形码的测试数据"""
+    return [
+        dict(product_id=1, name="苹果 Café", product_type="Goods", sales_price=Decimal("19.99"),
+             sales_tax_rate="9% SR", sales_price_incl_tax=Decimal("21.79"), cost=Decimal("0.00"),
+             purchase_tax_rate=None, category="水果", reference="REF001", barcode="B200",
+             internal_notes=None, description="", invoicing_policy=None, created_by="user",
+             created_at=datetime(2025, 9, 12, 10, 30, 0, 123456)),
+        dict(product_id=5, name="100% Juice", product_type="Goods ", sales_price=None,
+             sales_tax_rate=None, sales_price_incl_tax=None, cost=Decimal("99999999.99"),
+             purchase_tax_rate="9% TX", category="Drinks", reference=None, barcode="B100",
+             internal_notes="内部", description=None, invoicing_policy="Ordered quantities",
+             created_by=None, created_at=None),
+        dict(product_id=9, name="Juice_x", product_type="service", sales_price=Decimal("0.01"),
+             sales_tax_rate=None, sales_price_incl_tax=Decimal("0.01"), cost=None,
+             purchase_tax_rate=None, category=None, reference=None, barcode="B200",
+             internal_notes=None, description=None, invoicing_policy=None, created_by=None,
+             created_at=datetime(1999, 1, 1)),
+        dict(product_id=12, name="Empty", product_type=None, sales_price=Decimal("5.00"),
+             sales_tax_rate=None, sales_price_incl_tax=None, cost=None, purchase_tax_rate=None,
+             category=None, reference=None, barcode=None, internal_notes=None, description=None,
+             invoicing_policy=None, created_by=None, created_at=None),
+    ]
+
+
+def load(rows, directory):
+    """把测试数据写成快照文件并映射"""
+    path = os.path.join(directory, "check.snap")
+    with open(path, "wb") as f:
+        f.write(snapshot.build_snapshot(rows, version=1))
+    return snapshot.CatalogSnapshot(path)
+
+
+def check_round_trip(directory):
+    """编码后解码得到完全相同的行"""
+    rows = make_rows()
+    snap = load(rows, directory)
+    assert len(snap) == len(rows)
+    for row in rows:
+        assert snap.get_product_by_id(row["product_id"]) == row, row["product_id"]
+    assert snap.get_product_by_id(0) is None and snap.get_product_by_id(6) is None
+    assert snap.get_product_by_id(13) is None
+    assert [r["product_id"] for r in snap.get_all_products(1, 2)] == [5, 9]
+    assert load([], directory).get_all_products() == []
+
+
+def check_barcode(directory):
+    """条形码精确匹配，重复时取ID最小的产品"""
+    snap = load(make_rows(), directory)
+    assert snap.get_product_by_barcode("B200")["product_id"] == 1
+    assert snap.get_product_by_barcode("B100")["product_id"] == 5
+    assert snap.get_product_by_barcode("b200") is None
+    assert snap.get_product_by_barcode("B200 ") is None
+    assert snap.get_product_by_barcode("B") is None
+
+
+def check_search(directory):
+    """搜索规则与utf8mb4_unicode_ci下的数据库查询一致"""
+    snap = load(make_rows(), directory)
+
+    def ids(**kwargs):
+        products, total = snap.search_products(ProductSearchParams(**kwargs))
+        assert total >= len(products)
+        return [p["product_id"] for p in products]
+
+    assert ids(name="cafe") == [1]              # 不区分重音
+    assert ids(name="JUICE") == [5, 9]          # 不区分大小写
+    assert ids(name="0%") == [5]                # %是通配符："0" 后跟任意字符
+    assert ids(name="e_x") == [9]               # _匹配单个字符
+    assert ids(name="juice\\_") == [9]          # 反斜杠转义
+    assert ids(name="%") == [1, 5, 9, 12]
+    assert ids(product_type="goods") == [1, 5]  # 等值比较忽略末尾空格
+    assert ids(category="水") == [1]
+    assert ids(min_price=Decimal("5"), max_price=Decimal("19.99")) == [1, 12]
+    assert ids(min_price=Decimal("0.005"), max_price=Decimal("0.01")) == [9]
+    assert ids(name="juice", limit=1, offset=1) == [9]
+
+
+def make_session_factory(db_path):
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"timeout": 60})
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def add_product(session_factory, name):
+    db = session_factory()
+    try:
+        db.add(Product(name=name))
+        db.commit()
+    finally:
+        db.close()
+
+
+def check_publish(directory, session_factory):
+    """发布、跳过已覆盖的请求、并发发布和启动时重新发布"""
+    add_product(session_factory, "第一个")
+    first = snapshot.publish_snapshot(session_factory, directory)
+
+    # 当前版本在请求之后才开始读库，已包含请求前的写入，跳过构建
+    assert snapshot.publish_snapshot(session_factory, directory, requested_at=1) == first
+
+    # 请求晚于当前版本时重新构建
+    add_product(session_factory, "第二个")
+    second = snapshot.publish_snapshot(session_factory, directory, requested_at=time.time_ns())
+    assert second != first
+    assert len(snapshot.CatalogSnapshot(os.path.join(directory, second))) == 2
+
+    # 并发发布按锁依次进行，最终指针指向包含全部数据的最新版本
+    add_product(session_factory, "第三个")
+    threads = [
+        threading.Thread(target=snapshot.publish_snapshot, args=(session_factory, directory))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    current = snapshot._read_pointer(directory)
+    assert snapshot._snapshot_version(current) > snapshot._snapshot_version(second)
+    assert len(snapshot.CatalogSnapshot(os.path.join(directory, current))) == 3
+
+    # 绕过API修改数据库后重启：启动时重新发布
+    add_product(session_factory, "外部写入")
+    store = snapshot.SnapshotStore(session_factory, directory, check_interval=60)
+    store.ensure_published()
+    assert len(store.current()) == 4
+
+    # 同时启动的另一个worker直接使用已发布的版本
+    published = snapshot._read_pointer(directory)
+    other = snapshot.SnapshotStore(session_factory, directory)
+    other._started_at = store._started_at
+    other.ensure_published()
+    assert snapshot._read_pointer(directory) == published
+
+
+def check_current_throttle(directory):
+    """没有快照时也按间隔检查，不在每个请求上重试"""
+    store = snapshot.SnapshotStore(directory=directory, check_interval=60)
+    assert store.current() is None
+    with open(os.path.join(directory, snapshot.POINTER_FILE), "w", encoding="utf-8") as f:
+        f.write("catalog-1.snap")
+    shutil.copy(os.path.join(directory, "check.snap"), os.path.join(directory, "catalog-1.snap"))
+    assert store.current() is None  # 间隔内不重新读取指针
+    store._checked_at = float("-inf")
+    assert store.current() is not None
+
+
+def benchmark(directory, session_factory, count):
+    """对比按ID读取：快照 vs 数据库"""
+    db = session_factory()
+    try:
+        db.add_all(Product(name=f"产品{i}", sales_price=Decimal("1.00"), barcode=f"B{i}") for i in range(count))
+        db.commit()
+        ids = [pid for (pid,) in db.query(Product.product_id)]
+    finally:
+        db.close()
+    snap = snapshot.CatalogSnapshot(
+        os.path.join(directory, snapshot.publish_snapshot(session_factory, directory))
+    )
+
+    start = time.perf_counter()
+    for pid in ids:
+        snap.get_product_by_id(pid)
+    snapshot_rate = len(ids) / (time.perf_counter() - start)
+
+    db = session_factory()
+    try:
+        service = ProductService(db)
+        start = time.perf_counter()
+        for pid in ids:
+            service.get_product_by_id(pid)
+        db_rate = len(ids) / (time.perf_counter() - start)
+    finally:
+        db.close()
+
+    print(f"   {len(ids)} 个产品，按ID逐个读取")
+    print(f"   快照: {snapshot_rate:,.0f} 次/秒")
+    print(f"   数据库(SQLite): {db_rate:,.0f} 次/秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="目录快照检查")
+    parser.add_argument("--benchmark", action="store_true", help="对比快照与数据库的读取速度")
+    parser.add_argument("--count", type=int, default=10000, help="基准测试的产品数量")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    failed = False
+    try:
+        engine, session_factory = make_session_factory(os.path.join(tmp_dir, "check.db"))
+        publish_dir = os.path.join(tmp_dir, "publish")
+        for name, check in (
+            ("编码/解码往返", lambda: check_round_trip(tmp_dir)),
+            ("条形码查询", lambda: check_barcode(tmp_dir)),
+            ("搜索规则", lambda: check_search(tmp_dir)),
+            ("发布", lambda: check_publish(publish_dir, session_factory)),
+            ("快照检查间隔", lambda: check_current_throttle(tmp_dir)),
+        ):
+            try:
+                check()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed = True
+                print(f"❌ {name}: {e!r}")
+
+        if args.benchmark:
+            print("📊 读取对比")
+            benchmark(os.path.join(tmp_dir, "bench"), session_factory, args.count)
+        engine.dispose()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,17 @@ DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "1")
 DB_NAME = os.getenv("DB_NAME", "NUS")
 
+# 批量写入配置（合并并发的单条写请求为一次事务提交）
+WRITE_BATCH_ENABLED = os.getenv("WRITE_BATCH_ENABLED", "false").lower() == "true"
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WRITE_BATCH_WINDOW_MS", "5"))
+WRITE_BATCH_MAX_SIZE = int(os.getenv("WRITE_BATCH_MAX_SIZE", "200"))
+
+# 目录快照配置（各worker通过mmap共享的只读产品目录）
+CATALOG_SNAPSHOT_ENABLED = os.getenv("CATALOG_SNAPSHOT_ENABLED", "false").lower() == "true"
+CATALOG_SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR", "snapshots")
+CATALOG_SNAPSHOT_CHECK_INTERVAL = float(os.getenv("CATALOG_SNAPSHOT_CHECK_INTERVAL", "1"))
+CATALOG_SNAPSHOT_PUBLISH_DELAY = float(os.getenv("CATALOG_SNAPSHOT_PUBLISH_DELAY", "0.5"))
+
 # 创建数据库连接URL
 DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
@@ -6,13 +6,17 @@ from typing import List, Optional
 import tempfile
 import os
 
-from database import get_db, test_connection, engine, Base
+from database import (
+    get_db, test_connection, engine, Base, WRITE_BATCH_ENABLED, CATALOG_SNAPSHOT_ENABLED
+)
 from models import Product
 from schemas import (
     ProductResponse, ProductCreate, ProductUpdate, ProductSearchParams,
     APIResponse, ProductListResponse
 )
 from services import ProductService
+from batching import WriteBatcher
+from snapshot import SnapshotStore
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
@@ -26,6 +30,22 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# 批量写入（可选）：合并并发的单条写请求为一次事务提交
+write_batcher = WriteBatcher() if WRITE_BATCH_ENABLED else None
+
+# 目录快照（可选）：读请求从mmap共享的快照文件中读取，写入后发布新版本
+catalog_store = SnapshotStore() if CATALOG_SNAPSHOT_ENABLED else None
+
+def get_read_source(db: Session):
+    """读请求的数据源：已加载快照时使用快照，否则查询数据库"""
+    snapshot = catalog_store.current() if catalog_store else None
+    return snapshot if snapshot is not None else ProductService(db)
+
+def publish_catalog():
+    """写入成功后安排发布新的目录快照"""
+    if catalog_store:
+        catalog_store.request_publish()
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +60,8 @@ async def startup_event():
     """应用启动时测试数据库连接"""
     print("🚀 启动产品管理系统API...")
     test_connection()
+    if catalog_store:
+        catalog_store.ensure_published()
 
 @app.get("/", response_model=APIResponse)
 async def root():
@@ -63,7 +85,7 @@ async def get_products(
 ):
     """获取产品列表，支持搜索和分页"""
     try:
-        service = ProductService(db)
+        service = get_read_source(db)
         
         # 如果有搜索参数，使用搜索功能
         if any([name, category, product_type, min_price, max_price]):
@@ -94,7 +116,7 @@ async def get_products(
 async def get_product(product_id: int, db: Session = Depends(get_db)):
     """根据ID获取单个产品"""
     try:
-        service = ProductService(db)
+        service = get_read_source(db)
         product = service.get_product_by_id(product_id)
         
         if not product:
@@ -106,12 +128,32 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取产品失败: {str(e)}")
 
+@app.get("/products/barcode/{barcode}", response_model=ProductResponse)
+async def get_product_by_barcode(barcode: str, db: Session = Depends(get_db)):
+    """根据条形码获取单个产品"""
+    try:
+        service = get_read_source(db)
+        product = service.get_product_by_barcode(barcode)
+        
+        if not product:
+            raise HTTPException(status_code=404, detail="产品不存在")
+        
+        return product
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取产品失败: {str(e)}")
+
 @app.post("/products", response_model=ProductResponse, status_code=201)
 async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     """创建新产品"""
     try:
-        service = ProductService(db)
-        new_product = service.create_product(product)
+        if write_batcher:
+            new_product = await write_batcher.create(product)
+        else:
+            service = ProductService(db)
+            new_product = service.create_product(product)
+        publish_catalog()
         return new_product
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"创建产品失败: {str(e)}")
@@ -124,12 +166,16 @@ async def update_product(
 ):
     """更新产品信息"""
     try:
-        service = ProductService(db)
-        updated_product = service.update_product(product_id, product)
+        if write_batcher:
+            updated_product = await write_batcher.update(product_id, product)
+        else:
+            service = ProductService(db)
+            updated_product = service.update_product(product_id, product)
         
         if not updated_product:
             raise HTTPException(status_code=404, detail="产品不存在")
         
+        publish_catalog()
         return updated_product
     except HTTPException:
         raise
@@ -140,12 +186,16 @@ async def update_product(
 async def delete_product(product_id: int, db: Session = Depends(get_db)):
     """删除产品"""
     try:
-        service = ProductService(db)
-        success = service.delete_product(product_id)
+        if write_batcher:
+            success = await write_batcher.delete(product_id)
+        else:
+            service = ProductService(db)
+            success = service.delete_product(product_id)
         
         if not success:
             raise HTTPException(status_code=404, detail="产品不存在")
         
+        publish_catalog()
         return APIResponse(
             success=True,
             message="产品删除成功",
@@ -192,6 +242,7 @@ async def import_csv(file: UploadFile = File(...), db: Session = Depends(get_db)
         try:
             service = ProductService(db)
             result = service.bulk_import_csv(tmp_file_path)
+            publish_catalog()
             
             return APIResponse(
                 success=True,
@@ -17,6 +17,18 @@ class ProductService:
         """根据ID获取产品"""
         return self.db.query(Product).filter(Product.product_id == product_id).first()
 
+    def get_product_by_barcode(self, barcode: str) -> Optional[Product]:
+        """根据条形码获取产品（精确匹配，区分大小写和末尾空格）"""
+        # 条形码列使用不区分大小写的排序规则，先按该规则筛选候选，再精确比较；
+        # 条形码重复时取ID最小的产品，与目录快照一致
+        candidates = (
+            self.db.query(Product)
+            .filter(Product.barcode == barcode)
+            .order_by(Product.product_id)
+            .all()
+        )
+        return next((p for p in candidates if p.barcode == barcode), None)
+
     def search_products(self, params: ProductSearchParams) -> tuple[List[Product], int]:
         """搜索产品"""
         query = self.db.query(Product)
@@ -52,6 +64,14 @@ class ProductService:
 
     def create_product(self, product_data: ProductCreate) -> Product:
         """创建新产品"""
+        db_product = self.build_product(product_data)
+        self.db.add(db_product)
+        self.db.commit()
+        self.db.refresh(db_product)
+        return db_product
+
+    def build_product(self, product_data: ProductCreate) -> Product:
+        """根据创建数据构建产品对象（不提交）"""
         # 计算含税价格
         product_dict = product_data.model_dump()
         if product_dict.get('sales_price') and not product_dict.get('sales_price_incl_tax'):
@@ -60,11 +80,7 @@ class ProductService:
             tax_multiplier = Decimal(str(1 + tax_rate / 100))
             product_dict['sales_price_incl_tax'] = sales_price * tax_multiplier
         
-        db_product = Product(**product_dict)
-        self.db.add(db_product)
-        self.db.commit()
-        self.db.refresh(db_product)
-        return db_product
+        return Product(**product_dict)
 
     def update_product(self, product_id: int, product_data: ProductUpdate) -> Optional[Product]:
         """更新产品"""
@@ -72,6 +88,14 @@ class ProductService:
         if not db_product:
             return None
         
+        self.apply_update(db_product, product_data)
+        
+        self.db.commit()
+        self.db.refresh(db_product)
+        return db_product
+
+    def apply_update(self, db_product: Product, product_data: ProductUpdate) -> None:
+        """将更新数据应用到产品对象（不提交）"""
         update_dict = product_data.model_dump(exclude_unset=True)
         
         # 重新计算含税价格
@@ -87,10 +111,6 @@ class ProductService:
         
         for field, value in update_dict.items():
             setattr(db_product, field, value)
-        
-        self.db.commit()
-        self.db.refresh(db_product)
-        return db_product
 
     def delete_product(self, product_id: int) -> bool:
         """删除产品"""
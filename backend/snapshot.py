@@ -0,0 +1,479 @@
+"""
+产品目录快照
+
+把products表写成紧凑的、带版本号的二进制文件，各个worker进程通过mmap
+共享同一份数据，直接从映射内存中读取产品，而不必各自持有ORM对象和数据库连接。
+
+文件布局（所有数值为本机字节序）：
+    头部        魔数、格式版本、字节序、行数、快照版本、条形码索引长度、各段偏移
+    数值列      product_id / sales_price / sales_price_incl_tax / cost / created_at，
+                每列为按product_id排序的int64数组（金额以分存储，时间以微秒存储）
+    字符串索引  每个字符串列一组 (偏移, 长度) 的uint32数组，长度为0xFFFFFFFF表示NULL；
+                除产品字段外还包含name/category/product_type的搜索键（构建时已折叠大小写和重音）
+    条形码索引  按条形码排序的行号（uint32数组）
+    字符串堆    所有字符串的UTF-8字节
+
+发布新版本时写入新的 catalog-<版本>.snap 文件，再原子替换 CURRENT 指针文件，
+已映射旧版本的读者不受影响，下次检查时切换到新版本。版本号是持有发布锁后
+开始读库的时间（纳秒），在该时间之前提交的写入都包含在这个版本中。
+"""
+
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from database import (
+    SessionLocal, CATALOG_SNAPSHOT_DIR, CATALOG_SNAPSHOT_CHECK_INTERVAL,
+    CATALOG_SNAPSHOT_PUBLISH_DELAY
+)
+from models import Product
+from schemas import ProductSearchParams
+
+MAGIC = b"GFFCATLG"
+FORMAT_VERSION = 2
+BYTEORDER = 1 if sys.byteorder == "little" else 2
+HEADER = struct.Struct("=8sIIQQQQQQQ")
+POINTER_FILE = "CURRENT"
+LOCK_FILE = "publish.lock"
+MAX_RETRY_DELAY = 60.0
+
+NUMERIC_COLUMNS = ("product_id", "sales_price", "sales_price_incl_tax", "cost", "created_at")
+MONEY_COLUMNS = ("sales_price", "sales_price_incl_tax", "cost")
+STRING_COLUMNS = (
+    "name", "product_type", "sales_tax_rate", "purchase_tax_rate", "category",
+    "reference", "barcode", "internal_notes", "description", "invoicing_policy",
+    "created_by",
+)
+# 搜索列 -> 快照中对应的搜索键列
+SEARCH_KEY_COLUMNS = {
+    "name": "name_key",
+    "category": "category_key",
+    "product_type": "product_type_key",
+}
+STORED_STRING_COLUMNS = STRING_COLUMNS + tuple(SEARCH_KEY_COLUMNS.values())
+
+NULL_INT = -(2 ** 63)
+NULL_LENGTH = 0xFFFFFFFF
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _align(offset: int) -> int:
+    """按8字节对齐"""
+    return (offset + 7) & ~7
+
+
+def _encode_numeric(column: str, value) -> int:
+    """数值列编码为int64"""
+    if value is None:
+        return NULL_INT
+    if column in MONEY_COLUMNS:
+        return int(Decimal(str(value)).scaleb(2))
+    if column == "created_at":
+        return (value - EPOCH) // MICROSECOND
+    return int(value)
+
+
+def _decode_numeric(column: str, value: int):
+    """int64解码为对应的Python值"""
+    if value == NULL_INT:
+        return None
+    if column in MONEY_COLUMNS:
+        return Decimal(value).scaleb(-2)
+    if column == "created_at":
+        return EPOCH + value * MICROSECOND
+    return value
+
+
+def _fold(value: str) -> str:
+    """近似utf8mb4_unicode_ci的比较规则：不区分大小写和重音"""
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def _search_key(column: str, value: str) -> str:
+    """搜索键：等值比较的列（product_type）同时忽略末尾空格"""
+    key = _fold(value)
+    return key.rstrip(" ") if column == "product_type" else key
+
+
+def _like_regex(term: str):
+    """把LIKE模式（%、_通配，反斜杠转义）转换为正则表达式"""
+    parts = []
+    chars = iter(term)
+    for c in chars:
+        if c == "\\":
+            parts.append(re.escape(next(chars, "\\")))
+        elif c == "%":
+            parts.append(".*")
+        elif c == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(c))
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def build_snapshot(rows: List[dict], version: int) -> bytes:
+    """根据产品行（已按product_id排序）构建快照文件内容"""
+    count = len(rows)
+    numeric = array("q")
+    for column in NUMERIC_COLUMNS:
+        numeric.extend(_encode_numeric(column, row[column]) for row in rows)
+
+    heap = bytearray()
+    strings = array("I")
+    key_sources = {key: column for column, key in SEARCH_KEY_COLUMNS.items()}
+    for column in STORED_STRING_COLUMNS:
+        source = key_sources.get(column)
+        for row in rows:
+            value = row[source or column]
+            if value is not None and source:
+                value = _search_key(source, value)
+            if value is None:
+                strings.extend((0, NULL_LENGTH))
+            else:
+                data = value.encode("utf-8")
+                strings.extend((len(heap), len(data)))
+                heap += data
+
+    barcoded = [i for i, row in enumerate(rows) if row["barcode"] is not None]
+    barcoded.sort(key=lambda i: rows[i]["barcode"].encode("utf-8"))
+    barcodes = array("I", barcoded)
+
+    numeric_offset = _align(HEADER.size)
+    strings_offset = _align(numeric_offset + len(numeric) * numeric.itemsize)
+    barcode_offset = _align(strings_offset + len(strings) * strings.itemsize)
+    heap_offset = _align(barcode_offset + len(barcodes) * barcodes.itemsize)
+
+    buffer = bytearray(heap_offset + len(heap))
+    HEADER.pack_into(
+        buffer, 0, MAGIC, FORMAT_VERSION, BYTEORDER, count, version, len(barcodes),
+        numeric_offset, strings_offset, barcode_offset, heap_offset
+    )
+    for offset, data in (
+        (numeric_offset, numeric.tobytes()),
+        (strings_offset, strings.tobytes()),
+        (barcode_offset, barcodes.tobytes()),
+        (heap_offset, bytes(heap)),
+    ):
+        buffer[offset:offset + len(data)] = data
+    return bytes(buffer)
+
+
+class CatalogSnapshot:
+    """只读的内存映射产品目录快照，查询方法与ProductService同名"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        (magic, format_version, byteorder, self.count, self.version, barcode_count,
+         numeric_offset, strings_offset, barcode_offset, heap_offset) = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"无效的目录快照文件: {path}")
+        if byteorder != BYTEORDER:
+            raise ValueError(f"目录快照字节序与本机不一致: {path}")
+
+        n = self.count
+        numeric = view[numeric_offset:numeric_offset + 8 * n * len(NUMERIC_COLUMNS)].cast("q")
+        self._numeric = {
+            column: numeric[i * n:(i + 1) * n] for i, column in enumerate(NUMERIC_COLUMNS)
+        }
+        strings = view[strings_offset:strings_offset + 8 * n * len(STORED_STRING_COLUMNS)].cast("I")
+        self._strings = {
+            column: strings[i * 2 * n:(i + 1) * 2 * n]
+            for i, column in enumerate(STORED_STRING_COLUMNS)
+        }
+        self._barcodes = view[barcode_offset:barcode_offset + 4 * barcode_count].cast("I")
+        self._heap = view[heap_offset:]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _string_bytes(self, column: str, index: int) -> Optional[memoryview]:
+        """返回字符串在堆中的切片（零拷贝），NULL返回None"""
+        entries = self._strings[column]
+        offset, length = entries[2 * index], entries[2 * index + 1]
+        if length == NULL_LENGTH:
+            return None
+        return self._heap[offset:offset + length]
+
+    def _string(self, column: str, index: int) -> Optional[str]:
+        data = self._string_bytes(column, index)
+        return None if data is None else str(data, "utf-8")
+
+    def row(self, index: int) -> dict:
+        """解码第index行为产品字典"""
+        product = {
+            column: _decode_numeric(column, self._numeric[column][index])
+            for column in NUMERIC_COLUMNS
+        }
+        for column in STRING_COLUMNS:
+            product[column] = self._string(column, index)
+        return product
+
+    def get_product_by_id(self, product_id: int) -> Optional[dict]:
+        """根据ID获取产品（在已排序的product_id列上二分查找）"""
+        ids = self._numeric["product_id"]
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[mid] < product_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and ids[lo] == product_id:
+            return self.row(lo)
+        return None
+
+    def get_product_by_barcode(self, barcode: str) -> Optional[dict]:
+        """根据条形码获取产品（在条形码索引上二分查找，精确匹配，与ProductService一致）"""
+        target = barcode.encode("utf-8")
+        lo, hi = 0, len(self._barcodes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self._string_bytes("barcode", self._barcodes[mid])) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._barcodes):
+            index = self._barcodes[lo]
+            if self._string_bytes("barcode", index) == target:
+                return self.row(index)
+        return None
+
+    def get_all_products(self, skip: int = 0, limit: int = 100) -> List[dict]:
+        """分页获取产品"""
+        return [self.row(i) for i in range(skip, min(skip + limit, self.count))]
+
+    def search_products(self, params: ProductSearchParams) -> Tuple[List[dict], int]:
+        """搜索产品，条件与ProductService.search_products一致"""
+        matches = range(self.count)
+
+        # 与products表的utf8mb4_unicode_ci排序规则一致：不区分大小写和重音，
+        # 等值比较忽略末尾空格；与数据库的LIKE一样，搜索词中的%和_是通配符。
+        # 行的搜索键在构建快照时已经折叠好，查询时只需折叠搜索词
+        for column, term, exact in (
+            ("name", params.name, False),
+            ("category", params.category, False),
+            ("product_type", params.product_type, True),
+        ):
+            if not term:
+                continue
+            term = _search_key(column, term)
+            key_column = SEARCH_KEY_COLUMNS[column]
+            if exact:
+                target = term.encode("utf-8")
+                match = lambda key: bytes(key) == target
+            elif "%" in term or "_" in term or "\\" in term:
+                pattern = _like_regex(term)
+                match = lambda key: pattern.search(str(key, "utf-8")) is not None
+            else:
+                # UTF-8字节串上的子串匹配与字符串上的子串匹配等价，无需解码
+                target = term.encode("utf-8")
+                match = lambda key: target in bytes(key)
+            filtered = []
+            for i in matches:
+                key = self._string_bytes(key_column, i)
+                if key is not None and match(key):
+                    filtered.append(i)
+            matches = filtered
+
+        prices = self._numeric["sales_price"]
+        if params.min_price is not None:
+            low = Decimal(str(params.min_price)).scaleb(2)
+            matches = [i for i in matches if prices[i] != NULL_INT and prices[i] >= low]
+        if params.max_price is not None:
+            high = Decimal(str(params.max_price)).scaleb(2)
+            matches = [i for i in matches if prices[i] != NULL_INT and prices[i] <= high]
+
+        matches = list(matches)
+        page = matches[params.offset:params.offset + params.limit]
+        return [self.row(i) for i in page], len(matches)
+
+
+def _read_pointer(directory: str) -> Optional[str]:
+    """读取当前快照文件名"""
+    try:
+        with open(os.path.join(directory, POINTER_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _snapshot_version(filename: str) -> int:
+    """从 catalog-<版本>.snap 文件名解析版本号"""
+    return int(filename[len("catalog-"):-len(".snap")])
+
+
+@contextmanager
+def _publish_lock(directory: str):
+    """跨进程的发布锁，保证同一时间只有一个worker在发布快照"""
+    with open(os.path.join(directory, LOCK_FILE), "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK重试约10秒后仍拿不到锁会抛出异常，继续等待
+                    pass
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def publish_snapshot(
+    session_factory=SessionLocal,
+    directory: str = CATALOG_SNAPSHOT_DIR,
+    requested_at: Optional[int] = None,
+) -> str:
+    """从数据库读取products表，写出新版本快照并原子切换CURRENT指针
+
+    整个发布过程（读库、写文件、切换指针）持有跨进程锁，后发布的快照
+    一定读到更新的数据，不会出现旧内容覆盖新指针的情况。
+    requested_at为发布请求的时间（time.time_ns()）；如果当前版本在该时间之后
+    才开始读库，说明它已经包含了请求前的所有写入，直接跳过本次构建。
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    with _publish_lock(directory):
+        current = _read_pointer(directory)
+        if current and requested_at is not None and _snapshot_version(current) >= requested_at:
+            return current
+
+        # 持锁读库，版本号取读库开始的时间并保持单调递增
+        version = time.time_ns()
+        if current:
+            version = max(version, _snapshot_version(current) + 1)
+
+        db = session_factory()
+        try:
+            columns = [getattr(Product, c) for c in NUMERIC_COLUMNS + STRING_COLUMNS]
+            rows = [
+                dict(zip(NUMERIC_COLUMNS + STRING_COLUMNS, r))
+                for r in db.query(*columns).order_by(Product.product_id).all()
+            ]
+        finally:
+            db.close()
+
+        filename = f"catalog-{version}.snap"
+        path = os.path.join(directory, filename)
+        with open(path + ".tmp", "wb") as f:
+            f.write(build_snapshot(rows, version))
+        os.replace(path + ".tmp", path)
+
+        pointer = os.path.join(directory, POINTER_FILE)
+        with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+            f.write(filename)
+        os.replace(pointer + ".tmp", pointer)
+
+        # 清理比上一个版本更旧的文件，上一个版本留给正在切换的读者；
+        # 仍被映射的文件（Windows）删除失败时忽略
+        if not current:
+            return filename
+        for name in os.listdir(directory):
+            if (name.startswith("catalog-") and name.endswith(".snap") and
+                    _snapshot_version(name) < _snapshot_version(current)):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return filename
+
+
+class SnapshotStore:
+    """每个worker进程持有一个，负责映射当前快照并在写入后安排发布新版本"""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        directory: str = CATALOG_SNAPSHOT_DIR,
+        check_interval: float = CATALOG_SNAPSHOT_CHECK_INTERVAL,
+        publish_delay: float = CATALOG_SNAPSHOT_PUBLISH_DELAY,
+    ):
+        self.session_factory = session_factory
+        self.directory = directory
+        self.check_interval = check_interval
+        self.publish_delay = publish_delay
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._requested_at = 0
+        self._failures = 0
+        self._started_at = time.time_ns()
+
+    def current(self) -> Optional[CatalogSnapshot]:
+        """返回当前快照，每隔check_interval秒检查一次是否有新版本"""
+        now = time.monotonic()
+        # 没有可用快照时同样按间隔检查，避免每个请求都重试加载
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            filename = _read_pointer(self.directory)
+            if filename and (self._snapshot is None or
+                             os.path.basename(self._snapshot.path) != filename):
+                try:
+                    # 旧快照不主动关闭，最后一个引用释放时自动解除映射
+                    self._snapshot = CatalogSnapshot(os.path.join(self.directory, filename))
+                except (OSError, ValueError) as e:
+                    print(f"❌ 加载目录快照失败: {e}")
+        return self._snapshot
+
+    def ensure_published(self):
+        """启动时发布快照，包含服务停止期间或绕过API对数据库的修改；
+        其他worker在本进程启动之后已经发布过的话直接使用该版本"""
+        self._publish(self._started_at)
+        self._checked_at = float("-inf")
+        self.current()
+
+    def request_publish(self, delay: Optional[float] = None, requested_at: Optional[int] = None):
+        """写入后调用，在publish_delay秒内合并多次写入，只发布一次新版本"""
+        with self._lock:
+            self._requested_at = max(self._requested_at, requested_at or time.time_ns())
+            if self._timer is None:
+                self._timer = threading.Timer(
+                    self.publish_delay if delay is None else delay, self._run_publish
+                )
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _run_publish(self):
+        with self._lock:
+            self._timer = None
+            requested_at, self._requested_at = self._requested_at, 0
+        self._publish(requested_at)
+
+    def _publish(self, requested_at: int):
+        try:
+            publish_snapshot(self.session_factory, self.directory, requested_at)
+            self._failures = 0
+        except Exception as e:
+            # 发布失败时按指数退避重试，否则快照会一直停留在旧版本直到下一次写入
+            self._failures += 1
+            delay = min(max(self.publish_delay, 0.5) * 2 ** self._failures, MAX_RETRY_DELAY)
+            print(f"❌ 发布目录快照失败: {e}，{delay:.1f}秒后重试")
+            self.request_publish(delay, requested_at)